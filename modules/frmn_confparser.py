@@ -4,7 +4,7 @@
 Module to parse required settings for initiating proper API requests.
 
 Usage:
-- Import this module in the main script: `import modules.frmn_configparser as fc`.
+- Import this module in the main script: `import modules.frmn_confparser as fc`.
 
 Commands:
     - List Foreman environments: `python3 main.py --action listenvs`
@@ -16,8 +16,10 @@ For detailed information, refer to the README.md file.
 """
 
 import os
+import re
 import argparse
-import configparser
+import functools
+from pathlib import Path
 from platform import system as sm
 
 __author__ = 'Petyo Kunchev'
@@ -28,42 +30,107 @@ __license__ = 'MIT'
 # TODO: Add color prints (using `colorama`).
 # TODO: Log errors to a file and stdout (using `logging`).
 
+# The `[DEFAULT]`/`[foreman]` section bodies and their `key = value` settings in
+# `foreman.ini`. Like configparser, section names are case-sensitive and keys are
+# not (they are lowercased when read).
+SECTION_RE = {
+    name: re.compile(rf'^[ \t]*\[{name}\][ \t]*$(.*?)(?=^[ \t]*\[|\Z)', re.M | re.S)
+    for name in ('DEFAULT', 'foreman')
+}
+SETTING_RE = re.compile(r'^[ \t]*([^#;\[\s][^=:\n]*?)[ \t]*[=:][ \t]*(.*?)[ \t]*$', re.M)
+
+# configparser's `BasicInterpolation`: `%%` is a literal `%` and `%(key)s` the
+# value of another key in the section, any other `%` is an error
+INTERPOLATION_RE = re.compile(r'%(?:(%)|\((.*?)\)s)?')
+MAX_INTERPOLATION_DEPTH = 10
+
+
+@functools.lru_cache(maxsize=1)
+def os_family() -> str:
+    """
+    Determine the OS family once, `platform.system()` may spawn `uname`.
+
+    Returns:
+        str: Lowercase OS family name (e.g. linux, darwin, windows).
+    """
+    return sm().lower()
+
 
 def print_os_warning():
     """
     Display a warning if the OS is unsupported for Ansible inventory use.
     """
-    os_family = sm().lower()
+    os_family_name = os_family()
     supported_platforms = ['linux', 'darwin']
 
-    if os_family not in supported_platforms:
+    if os_family_name not in supported_platforms:
         print(
-            f'Warning: Running on {os_family.upper()} OS. Transfer the '
+            f'Warning: Running on {os_family_name.upper()} OS. Transfer the '
             'generated inventory file to a system that supports Ansible.'
         )
 
 
+def _interpolate(config: dict, key: str, depth: int = 0) -> str:
+    """
+    Expand the `%%` and `%(key)s` references of a setting like configparser.
+
+    Returns:
+        str: The setting value with every reference expanded.
+    """
+    if depth > MAX_INTERPOLATION_DEPTH:
+        raise ValueError(f'Interpolation too deeply recursive in `foreman.ini` key: {key}')
+
+    def expand(match: re.Match) -> str:
+        if match.group(1):
+            return '%'
+        if match.group(2) is None:
+            raise ValueError(f"'%' must be followed by '%' or '(' in `foreman.ini` key: {key}")
+        reference = match.group(2).lower()
+        if reference not in config:
+            raise ValueError(
+                f'Bad interpolation reference %({reference})s in `foreman.ini` key: {key}'
+            )
+        return _interpolate(config, reference, depth + 1)
+
+    return INTERPOLATION_RE.sub(expand, config[key])
+
+
+@functools.lru_cache(maxsize=1)
 def read_settings() -> dict:
     """
-    Parse settings from the `foreman.ini` configuration file.
+    Parse settings from the `foreman.ini` configuration file. The file is read
+    once and the settings are reused by any later call.
 
     Returns:
         dict: Configuration parameters (base_url, username, password, hfile).
     """
-    config = configparser.ConfigParser()
     confdir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'config'))
     default_ini_path = os.path.join(confdir, 'foreman.ini')
     print(f'Reading Foreman configuration from: {default_ini_path}')
 
     foreman_ini_path = os.environ.get('FOREMAN_INI_PATH', default_ini_path)
-    config.read(foreman_ini_path)
+    try:
+        text = Path(foreman_ini_path).read_text()
+    except OSError:
+        text = ''
+
+    # `[DEFAULT]` values apply only when a `[foreman]` section exists and are
+    # overridden by it
+    config = {}
+    if SECTION_RE['foreman'].search(text):
+        for name in ('DEFAULT', 'foreman'):
+            section = SECTION_RE[name].search(text)
+            if section:
+                config.update(
+                    (key.lower(), value) for key, value in SETTING_RE.findall(section.group(1))
+                )
 
     required = ['base_url', 'username', 'password', 'hfile']
     settings = {}
     missing = []
 
     for key in required:
-        value = config.get('foreman', key, fallback=None)
+        value = _interpolate(config, key) if key in config else None
         if not value:
             missing.append(key)
         settings[key] = value
@@ -76,9 +143,11 @@ def read_settings() -> dict:
     return settings
 
 
+@functools.lru_cache(maxsize=1)
 def parse_args() -> argparse.Namespace:
     """
-    Parse command-line arguments for the script.
+    Parse command-line arguments for the script. The parser is built once and
+    the parsed result is reused by any later call.
 
     Returns:
         argparse.Namespace: Parsed arguments (action, environment).
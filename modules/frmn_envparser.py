@@ -4,7 +4,7 @@
 Initiate API calls to the Foreman API endpoint(s) and parse the environments and the host groups 
 with hosts for the desired environment.
 
-Import in this module in the main script frmn_envparser.py: import modules.frmn_envparser as fe
+Import this module in the main script main.py: import modules.frmn_envparser as fe
 For more detailed information check the README.md file.
 """
 
@@ -17,17 +17,62 @@ __maintainer__ = "Petyo Kunchev"
 __license__ = "MIT"
 
 import os
+import sys
+import hashlib
+import tempfile
+import functools
 from pathlib import Path
-from typing import Any
+from typing import Any, Iterator, Optional, TYPE_CHECKING
 from datetime import datetime
-import json
-import urllib3
-import requests
-from requests.models import Response
+from itertools import chain
+from operator import itemgetter
+import orjson
 from collections import defaultdict
 
-# Suppress warnings for self-signed SSL Foreman certificates (if used)
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+# requests/urllib3 are imported on the first API request, keeping them off the startup path
+if TYPE_CHECKING:
+    import requests
+    from requests.models import Response
+
+# Current user's home folder, resolved once: the inventory file and the API cache are saved under it
+_HOME: str = str(Path.home())
+
+# Local cache of the Foreman API responses, revalidated with ETag/Last-Modified on every request
+CACHE_DIR: Path = Path(_HOME, ".cache", "foreman_inv")
+
+# Hosts are requested page by page, with up to PAGE_WORKERS pages fetched ahead of the parsing over as many
+# pooled connections
+PER_PAGE: int = 500
+PAGE_WORKERS: int = 4
+
+
+def _write_cache(cache_file: Path, data: bytes):
+    """
+    Atomically replace the cache file with the provided data, through a temporary file private to this writer.
+
+    Parameters:
+        cache_file (Path): Cache file to replace
+        data (bytes): New contents of the cache file
+    """
+    with tempfile.NamedTemporaryFile(dir=CACHE_DIR, delete=False) as tmp:
+        try:
+            tmp.write(data)
+            tmp.close()
+            os.replace(tmp.name, cache_file)
+        except OSError:
+            tmp.close()
+            os.unlink(tmp.name)
+            raise
+
+
+@functools.lru_cache(maxsize=1)
+def _disable_insecure_warnings():
+    """
+    Suppress warnings for self-signed SSL Foreman certificates (if used), once per process.
+    """
+    import urllib3
+
+    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 
 class AnsibleInventory:
@@ -57,33 +102,146 @@ class AnsibleInventory:
         self.username: str = username
         self.password: str = password
         self.envid: str = envid
-        self.hfile: str = str(Path.home()) + os.path.sep + hostfile + envid
+        self.hostfile: str = hostfile
+        # URLs answered from the cache because Foreman was unreachable, filled in by the (concurrent) requests
+        self._stale_urls: set = set()
+
+    @functools.cached_property
+    def hfile(self) -> str:
+        """
+        Path of the generated inventory file in the current user's home folder, built on first use.
+        """
+        return os.path.join(_HOME, self.hostfile + self.envid)
+
+    @functools.cached_property
+    def _session(self) -> "requests.Session":
+        """
+        Shared session, built on the first API request. Keeps the TLS connection to Foreman alive between the
+        API requests.
+        """
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        _disable_insecure_warnings()
+        session: requests.Session = requests.Session()
+        session.auth = (self.username, self.password)
+        session.verify = False
+        session.headers["Accept-Encoding"] = "gzip, deflate"
+        session.mount(self.base_url, HTTPAdapter(
+            pool_connections=PAGE_WORKERS,
+            pool_maxsize=PAGE_WORKERS,
+            max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504]),
+        ))
+        return session
+
+    def _fetch(self, url: str, quiet: bool = False, offline: bool = False) -> bytes:
+        """
+        Request the provided Foreman API URL and return the JSON response body. Responses are cached locally along
+        with their validators, so an unchanged payload is answered with 304 and served from the cache. If Foreman is
+        unreachable, the last cached response body is returned instead and the URL is recorded in `_stale_urls`.
+        The cache is best-effort: when it cannot be read or written, a plain request is sent and its body returned.
+        Once Foreman is known to be unreachable, `offline` serves the cached response without sending the request.
+
+        Parameters:
+            url (str): Foreman API URL to request
+            quiet (bool): Do not print the request status or the cache fallback, used for the concurrent requests
+            offline (bool): Serve the cached response without requesting Foreman
+
+        Returns:
+            bytes: The JSON response body
+        """
+        import requests
+
+        digest: str = hashlib.blake2b(f"{url} {self.username}".encode(), digest_size=16).hexdigest()
+        body_file: Path = CACHE_DIR / f"{digest}.json"
+        meta_file: Path = CACHE_DIR / f"{digest}.meta"
+        cached_body: Optional[bytes] = None
+        headers: dict = {}
+
+        try:
+            cached_body = body_file.read_bytes()
+            meta: dict = orjson.loads(meta_file.read_bytes())
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+        except (OSError, orjson.JSONDecodeError):
+            headers.clear()
+
+        # Skip the connect timeouts and retries of yet another request, Foreman already proved unreachable
+        if offline:
+            if cached_body is None:
+                raise requests.exceptions.ConnectionError(f"Foreman API unreachable, no cached response for: {url}")
+            self._stale_urls.add(url)
+            return cached_body
+
+        try:
+            response: "Response" = self._session.get(url, timeout=5, headers=headers)
+        except (
+            requests.exceptions.ConnectionError, requests.exceptions.Timeout, requests.exceptions.RetryError
+        ) as err:
+            if cached_body is None:
+                raise
+            self._stale_urls.add(url)
+            if not quiet:
+                print(f"Foreman API unreachable ({err}), using the cached response: {body_file}")
+            return cached_body
+
+        response.raise_for_status()
+        if not quiet:
+            print(f"API request status code: {response.status_code}")
+        if response.status_code == 304:
+            return cached_body
+
+        # Drop the old validators first, so an interrupted update never pairs them with a different body
+        try:
+            CACHE_DIR.mkdir(mode=0o700, parents=True, exist_ok=True)
+            meta_file.unlink(missing_ok=True)
+            _write_cache(body_file, response.content)
+            _write_cache(meta_file, orjson.dumps({
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+            }))
+        except OSError:
+            pass
+
+        return response.content
+
+    def _fetch_many(self, urls: list, offline: bool = False) -> Iterator[bytes]:
+        """
+        Request the provided Foreman API URLs concurrently over the shared session and yield the JSON response
+        bodies in the order of the URLs, as soon as each one is available. The requests do not print their status
+        from the worker threads, the URLs answered from the cache are left in `_stale_urls` for the caller to report.
+
+        Parameters:
+            urls (list): Foreman API URLs to request
+            offline (bool): Serve the cached responses without requesting Foreman
+
+        Returns:
+            Iterator[bytes]: The JSON response bodies
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=PAGE_WORKERS) as pool:
+            yield from pool.map(functools.partial(self._fetch, quiet=True, offline=offline), urls)
 
     def parse_envs(self):
         """
         Parse the Foreman API, collect and print to the console data for
         the available and configured environments: env name and env ID.
         """
+        import requests
+
         try:
-            response: Response = requests.get(
-                self.base_url, verify=False, timeout=5, auth=(self.username, self.password)
-            )
-            response.raise_for_status()
-            print(f"API request status code: {response.status_code}")
-            env_data: dict = response.json()
-            data: dict = env_data["results"]
-            parsed_envs, parsed_env_ids = [], []
+            env_data: dict = orjson.loads(self._fetch(self.base_url))
             results_dict: defaultdict[Any, list] = defaultdict(list)
 
-            for datum in data:
-                parsed_envs.append(datum["name"])
-                parsed_env_ids.append(datum["id"])
-
-            for env_name, env_id in zip(parsed_envs, parsed_env_ids):
-                results_dict[env_name].append(env_id)
+            for datum in env_data["results"]:
+                results_dict[datum["name"]].append(datum["id"])
 
             print("-All Foreman environments and their respective IDs-")
-            [print(f"{name:<15} {ids}") for name, ids in results_dict.items()]
+            sys.stdout.write("".join(f"{name:<15} {ids}\n" for name, ids in results_dict.items()))
 
         except requests.exceptions.HTTPError as http_err:
             print(f"HTTP error: {http_err}")
@@ -93,6 +251,8 @@ class AnsibleInventory:
             print(f"Timeout error: {timeout_err}")
         except requests.exceptions.RequestException as req_err:
             print(f"General error: {req_err}")
+        except orjson.JSONDecodeError as json_err:
+            print(f"JSON parsing error: {json_err}")
 
     def parse_hosts(self, environment_id: str = None):
         """
@@ -102,43 +262,78 @@ class AnsibleInventory:
         Parameters:
             environment_id (str): Foreman environment ID provided as arg
         """
-        url: str = f"{self.base_url}{environment_id}/hosts?per_page=100000"
+        import requests
+
+        url: str = f"{self.base_url}{environment_id}/hosts?per_page={PER_PAGE}&page="
         print("Starting hosts file generation, please wait...")
 
         now: datetime = datetime.now()
-        timestamp: str = now.strftime("%d/%m/%Y %H:%M:%S")
+        header: str = (
+            f"# Ansible hosts file for Foreman inventory id {environment_id} "
+            f"generated on {now:%d/%m/%Y %H:%M:%S}\n"
+        )
 
         print(f"Parsing Foreman environment with id: [{environment_id}]")
 
         try:
-            response: Response = requests.get(
-                url, verify=False, timeout=5, auth=(self.username, self.password)
-            )
-            response.raise_for_status()
-            print(f"API request status code: {response.status_code}")
-            foreman_data: dict = response.json()
-            data = foreman_data["results"]
-            parsed_groups, parsed_hosts = [], []
+            first_page: dict = orjson.loads(self._fetch(f"{url}1"))
+            total: int = first_page.get("subtotal", first_page.get("total", 0))
+            # Foreman may cap the requested page size, count the pages with the one it actually used
+            per_page: int = int(first_page.get("per_page") or PER_PAGE)
+            page_urls: list = [f"{url}{page}" for page in range(2, -(-total // per_page) + 1)]
             results_dict: defaultdict[Any, list] = defaultdict(list)
 
-            for datum in data:
-                parsed_groups.append(datum["hostgroup_title"])
-                parsed_hosts.append(datum["name"])
-
-            for group, host in zip(parsed_groups, parsed_hosts):
-                results_dict[group].append(host)
+            # The remaining pages are fetched concurrently and consumed in page order as they arrive. When the first
+            # page already fell back to the cache, the others are read from the cache without further requests
+            offline: bool = f"{url}1" in self._stale_urls
+            pages = chain(
+                [first_page], (orjson.loads(body) for body in self._fetch_many(page_urls, offline=offline))
+            )
+            group_host = itemgetter("hostgroup_title", "name")
+            for page_data in pages:
+                for group, host in map(group_host, page_data["results"]):
+                    results_dict[group].append(host)
+            print(f"Parsed {len(page_urls) + 1} page(s) of up to {per_page} hosts")
+            stale_pages: int = len(self._stale_urls.intersection(page_urls))
+            if stale_pages:
+                print(
+                    f"Warning: Foreman API unreachable for {stale_pages} of the {len(page_urls)} remaining page(s), "
+                    "their cached responses were used"
+                )
 
             try:
-                with open(self.hfile, "w") as hosts:
-                    hosts.write(
-                        f"# Ansible hosts file for Foreman inventory id {environment_id} "
-                        f"generated on {timestamp}\n"
+                # Build the whole file up front and hand it to the OS in a single write call
+                header_bytes: bytes = header.encode()
+                buf: bytearray = bytearray(header_bytes)
+                group_fmt = "\n[{}]\n{}\n".format
+                # Groups and hosts are sorted and deduplicated, keeping the file stable between runs
+                for key in sorted(results_dict, key=str):
+                    buf += group_fmt(key, "\n".join(sorted(set(results_dict[key])))).encode()
+
+                # The signature skips the timestamped header, so it only changes along with the groups and hosts
+                sig_file: str = f"{self.hfile}.sig"
+                signature: bytes = hashlib.blake2b(memoryview(buf)[len(header_bytes):], digest_size=16).digest()
+                try:
+                    with open(sig_file, "rb") as sig:
+                        previous_signature: bytes = sig.read(16)
+                except OSError:
+                    previous_signature = b""
+
+                if signature == previous_signature and os.path.exists(self.hfile):
+                    print(f"The inventory is unchanged, keeping the existing file: {self.hfile}")
+                else:
+                    fd: int = os.open(
+                        self.hfile, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0), 0o644
                     )
-                    for key, values in results_dict.items():
-                        hosts.write(f"\n[{key}]\n")
-                        for value in values:
-                            hosts.write(f"{value}\n")
-                print(f"The following inventory file has been generated locally: {self.hfile}")
+                    try:
+                        view: memoryview = memoryview(buf)
+                        while view:
+                            view = view[os.write(fd, view):]
+                    finally:
+                        os.close(fd)
+                    with open(sig_file, "wb") as sig:
+                        sig.write(signature)
+                    print(f"The following inventory file has been generated locally: {self.hfile}")
             except IOError:
                 print(f"Error opening the target file: {self.hfile}, please check.")
 
@@ -150,3 +345,5 @@ class AnsibleInventory:
             print(f"Timeout error: {timeout_err}")
         except requests.exceptions.RequestException as req_err:
             print(f"General error: {req_err}")
+        except orjson.JSONDecodeError as json_err:
+            print(f"JSON parsing error: {json_err}")
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+
+"""
+Check `read_settings` against configparser, which it replaces, on the same
+`foreman.ini` contents.
+
+Run from the project root: `python -m unittest discover tests`
+"""
+
+import os
+import io
+import tempfile
+import unittest
+import configparser
+from contextlib import redirect_stdout
+from unittest import mock
+
+import modules.frmn_confparser as fc
+
+REQUIRED = ['base_url', 'username', 'password', 'hfile']
+
+CASES = {
+    'shipped': None,
+    'plain': (
+        '[foreman]\nbase_url = https://f/api/\nusername = u\npassword = p\nhfile = inv_\n'
+    ),
+    'mixed_case_keys': (
+        '[foreman]\nBase_URL = https://f/api/\nUSERNAME=u\nPassword : p:w=1\nhFile = inv_\n'
+    ),
+    'indented_keys': (
+        '[foreman]\n  base_url = https://f/api/\n  username = u\n  password = p\n  hfile = inv_\n'
+    ),
+    'default_section': (
+        '[DEFAULT]\nusername = du\npassword = dp\n'
+        '[foreman]\nbase_url = https://f/api/\npassword = p\nhfile = inv_\n'
+    ),
+    'default_without_foreman': (
+        '[DEFAULT]\nbase_url = b\nusername = du\npassword = dp\nhfile = h\n'
+    ),
+    'other_sections': (
+        '[other]\nbase_url = no\n[foreman]\nbase_url = https://f/\nusername = u\n'
+        ';password = bad\npassword = p\n# hfile = bad\nhfile = inv_ \n[x]\nhfile=zz\n'
+    ),
+    'commented_and_empty': (
+        '[foreman]\n;base_url = x\nusername = u\npassword =\nhfile = h\n'
+    ),
+    'section_name_case': (
+        '[Foreman]\nbase_url = x\nusername = u\npassword = p\nhfile = h\n'
+    ),
+    'empty_file': '',
+    'escaped_percent': (
+        '[foreman]\nbase_url = https://f/api/%%7E/\nusername = u\npassword = p%%w%%\nhfile = inv_\n'
+    ),
+    'references': (
+        '[DEFAULT]\nhost = f.example.test\n'
+        '[foreman]\nbase_url = https://%(HOST)s/api/\nusername = u\n'
+        'secret = s%%1\npassword = %(secret)s-%(username)s\nhfile = inv_%(username)s_\n'
+    ),
+    'empty_reference': (
+        '[foreman]\nempty =\nbase_url = https://f/\nusername = u\npassword = p\nhfile = %(empty)s\n'
+    ),
+    'missing_reference': (
+        '[foreman]\nbase_url = https://f/\nusername = u\npassword = %(nope)s\nhfile = h\n'
+    ),
+    'bare_percent': (
+        '[foreman]\nbase_url = https://f/\nusername = u\npassword = 50%\nhfile = h\n'
+    ),
+    'recursive_reference': (
+        '[foreman]\nbase_url = https://f/\nusername = u\npassword = %(hfile)s\nhfile = %(password)s\n'
+    ),
+}
+
+
+def configparser_result(path):
+    """
+    Settings as the previous configparser implementation returned them, or
+    `ValueError` when it would have refused the file.
+    """
+    config = configparser.ConfigParser()
+    config.read(path)
+    try:
+        settings = {key: config.get('foreman', key, fallback=None) for key in REQUIRED}
+    except configparser.Error:
+        return ValueError
+    missing = [key for key in REQUIRED if not settings[key]]
+    if missing:
+        return f'Missing required configuration keys in `foreman.ini`: {", ".join(missing)}'
+    return settings
+
+
+def read_settings_result(path):
+    """
+    Settings returned by `read_settings`, or the error it raised.
+    """
+    fc.read_settings.cache_clear()
+    with mock.patch.dict(os.environ, {'FOREMAN_INI_PATH': path}), redirect_stdout(io.StringIO()):
+        try:
+            return fc.read_settings()
+        except ValueError as err:
+            return str(err) if str(err).startswith('Missing required') else ValueError
+        finally:
+            fc.read_settings.cache_clear()
+
+
+class ReadSettingsTest(unittest.TestCase):
+
+    def test_matches_configparser(self):
+        shipped = os.path.join(os.path.dirname(fc.__file__), '..', 'config', 'foreman.ini')
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for name, text in CASES.items():
+                with self.subTest(name):
+                    path = shipped
+                    if text is not None:
+                        path = os.path.join(tmpdir, f'{name}.ini')
+                        with open(path, 'w') as ini:
+                            ini.write(text)
+                    self.assertEqual(read_settings_result(path), configparser_result(path))
+
+    def test_escaped_percent(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'foreman.ini')
+            with open(path, 'w') as ini:
+                ini.write(CASES['escaped_percent'])
+            self.assertEqual(read_settings_result(path)['password'], 'p%w%')
+
+
+if __name__ == '__main__':
+    unittest.main()